@@ -4,22 +4,22 @@ Processes multiple videos from the command line using per-video
 .motiontracker.json settings and shared tracking/processing parameters.
 """
 
+import csv
 import glob
 import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 import cv2
 import numpy as np
-import pandas as pd
 
 from MotionTrackerBeta.classes.classes import Motion, Ruler
-from MotionTrackerBeta.widgets.trackers import TrackingThreadV2
-from MotionTrackerBeta.widgets.process import PostProcesserThread
 
 from MotionTrackerBeta.video_io import open_video
 
 VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".wmv", ".flv", ".webm", ".dcm", ".dicom"}
+_EXT_TUPLE = tuple(VIDEO_EXTENSIONS)
 
 
 def find_videos(video_args):
@@ -28,10 +28,13 @@ def find_videos(video_args):
     for arg in video_args:
         path = os.path.abspath(arg)
         if os.path.isdir(path):
-            for f in sorted(os.listdir(path)):
-                _, ext = os.path.splitext(f)
-                if ext.lower() in VIDEO_EXTENSIONS:
-                    result.append(os.path.join(path, f))
+            with os.scandir(path) as it:
+                entries = sorted(
+                    (e for e in it
+                     if e.name.lower().endswith(_EXT_TUPLE) and e.is_file()),
+                    key=lambda e: e.name,
+                )
+            result.extend(e.path for e in entries)
         elif os.path.isfile(path):
             result.append(path)
         else:
@@ -41,10 +44,33 @@ def find_videos(video_args):
     return result
 
 
+def videos_with_settings(videos):
+    """Return the set of video paths that have a .motiontracker.json file.
+
+    Each parent directory is listed once instead of checking every
+    settings file separately.
+    """
+    listed = {}
+    result = set()
+    for video in videos:
+        directory, name = os.path.split(video)
+        if directory not in listed:
+            try:
+                with os.scandir(directory or ".") as it:
+                    listed[directory] = {e.name for e in it
+                                         if e.name.endswith(".motiontracker.json")}
+            except OSError:
+                listed[directory] = set()
+        if name + ".motiontracker.json" in listed[directory]:
+            result.add(video)
+    return result
+
+
 def resolve_videos(video_args):
     """Find video files that have .motiontracker.json settings."""
-    return [v for v in find_videos(video_args)
-            if os.path.isfile(v + ".motiontracker.json")]
+    videos = find_videos(video_args)
+    existing = videos_with_settings(videos)
+    return [v for v in videos if v in existing]
 
 
 def build_diff_parameters(args):
@@ -82,15 +108,37 @@ def build_diff_parameters(args):
 
 
 def process_single_video(video_path, tracker_type, size_tracking, fps_override,
-                         diff_parameters, unit):
+                         diff_parameters, unit, force=False):
     """Process one video: track, differentiate, export CSV.
 
-    Returns (success, csv_path, error_message).
+    Unless force is set, a CSV newer than both the video and its settings
+    file is reused without processing the video again.
+
+    Returns (success, csv_path, error_message). error_message is "cached"
+    when an existing up-to-date CSV was reused.
     """
+    # Qt and the differentiation backends are only needed here, keep them
+    # out of the import path of the match command and find_videos users
+    from MotionTrackerBeta.widgets.trackers import TrackingThreadV2
+    from MotionTrackerBeta.widgets.process import PostProcesserThread
+
     settings_path = video_path + ".motiontracker.json"
     if not os.path.isfile(settings_path):
         return False, None, f"Settings file not found: {settings_path}"
 
+    base, _ = os.path.splitext(video_path)
+    csv_path = base + ".csv"
+
+    # Skip videos whose results are newer than their inputs
+    if not force:
+        try:
+            csv_mtime = os.path.getmtime(csv_path)
+            if csv_mtime > max(os.path.getmtime(video_path),
+                               os.path.getmtime(settings_path)):
+                return True, csv_path, "cached"
+        except OSError:
+            pass
+
     try:
         with open(settings_path) as f:
             data = json.load(f)
@@ -113,6 +161,12 @@ def process_single_video(video_path, tracker_type, size_tracking, fps_override,
     if not camera.isOpened():
         return False, None, f"Cannot open video: {video_path}"
 
+    # Frames are consumed one at a time, keep the backend buffer minimal
+    try:
+        camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    except cv2.error:
+        pass
+
     num_frames = int(camera.get(cv2.CAP_PROP_FRAME_COUNT))
     video_fps = camera.get(cv2.CAP_PROP_FPS)
 
@@ -163,38 +217,35 @@ def process_single_video(video_path, tracker_type, size_tracking, fps_override,
         return False, None, f"Processing failed: {pp_errors[0]}"
 
     # --- Export CSV ---
-    cols = ["Time (s)"]
-    data_arrays = [np.array(timestamp)]
-    unit_suffix = unit
+    tracked = [obj for obj in objects if obj.position is not None]
 
-    for obj in objects:
-        if obj.position is None:
-            continue
-
-        pos_x = obj.position[:, 0].copy()
-        pos_y = -obj.position[:, 1].copy()
-        vel_x = obj.velocity[:, 0].copy()
-        vel_y = -obj.velocity[:, 1].copy()
-        acc_x = obj.acceleration[:, 0].copy()
-        acc_y = -obj.acceleration[:, 1].copy()
-
-        if unit == "mm" and ruler.mm_per_pix is not None:
-            pos_x *= ruler.mm_per_pix
-            pos_y *= ruler.mm_per_pix
-            vel_x *= ruler.mm_per_pix
-            vel_y *= ruler.mm_per_pix
-            acc_x *= ruler.mm_per_pix
-            acc_y *= ruler.mm_per_pix
-        elif unit == "m" and ruler.mm_per_pix is not None:
-            factor = ruler.mm_per_pix / 1000
-            pos_x *= factor
-            pos_y *= factor
-            vel_x *= factor
-            vel_y *= factor
-            acc_x *= factor
-            acc_y *= factor
-        elif unit in ("mm", "m") and ruler.mm_per_pix is None:
+    factor = None
+    unit_suffix = unit
+    if unit in ("mm", "m"):
+        if ruler.mm_per_pix is None:
             unit_suffix = "pix"
+        elif unit == "mm":
+            factor = ruler.mm_per_pix
+        else:
+            factor = ruler.mm_per_pix / 1000
+
+    # Per (X, Y) column scale: flips the image Y axis and converts units
+    scale = np.array([1.0, -1.0])
+    if factor is not None:
+        scale *= factor
+
+    # One preallocated float32 block with 6 columns per object, each
+    # written and scaled in a single pass. float32 is ample for tracked
+    # coordinates and halves the memory the export touches. Timestamps
+    # stay float64 so frame times like 1/30 s are written exactly.
+    cols = ["Time (s)"]
+    all_data = np.empty((len(timestamp), 6 * len(tracked)), dtype=np.float32)
+
+    for i, obj in enumerate(tracked):
+        k = 6 * i
+        np.multiply(obj.position, scale, out=all_data[:, k:k + 2])
+        np.multiply(obj.velocity, scale, out=all_data[:, k + 2:k + 4])
+        np.multiply(obj.acceleration, scale, out=all_data[:, k + 4:k + 6])
 
         cols.extend([
             f"{obj.name} X pos ({unit_suffix})",
@@ -204,18 +255,35 @@ def process_single_video(video_path, tracker_type, size_tracking, fps_override,
             f"{obj.name} X acc ({unit_suffix}/s^2)",
             f"{obj.name} Y acc ({unit_suffix}/s^2)",
         ])
-        data_arrays.extend([pos_x, pos_y, vel_x, vel_y, acc_x, acc_y])
 
-    all_data = np.column_stack(data_arrays)
-    df = pd.DataFrame(all_data, columns=cols)
+    # Write only the significant digits of each type: 15 for float64,
+    # 7 for float32, so no representation noise ends up in the CSV
+    row_format = ",".join(["%.15g"] + ["%.7g"] * all_data.shape[1]) + "\n"
+    timestamp = np.asarray(timestamp, dtype=np.float64).tolist()
 
-    base, _ = os.path.splitext(video_path)
-    csv_path = base + ".csv"
-    df.to_csv(csv_path, index=False)
+    with open(csv_path, "w", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerow(cols)
+        f.writelines(row_format % (t, *values)
+                     for t, values in zip(timestamp, all_data.tolist()))
 
     return True, csv_path, None
 
 
+_worker_app = None
+
+
+def _init_worker():
+    """Prepare a batch worker process for running the Qt processing threads."""
+    global _worker_app
+
+    # QCoreApplication required for QThread.__init__
+    from PyQt5.QtCore import QCoreApplication
+    _worker_app = QCoreApplication([])
+
+    # Videos already run in parallel, avoid oversubscribing the cores
+    cv2.setNumThreads(1)
+
+
 def run_batch(args):
     """Entry point for batch CLI mode."""
     videos = resolve_videos(args.videos)
@@ -223,36 +291,64 @@ def run_batch(args):
         print("No video files found.", file=sys.stderr)
         sys.exit(1)
 
-    # QCoreApplication required for QThread.__init__
-    from PyQt5.QtCore import QCoreApplication
-    app = QCoreApplication(sys.argv)  # noqa: F841
-
     diff_parameters = build_diff_parameters(args)
 
+    jobs = args.jobs
+    if jobs is None:
+        jobs = max(1, (os.cpu_count() or 1) // 2)
+    jobs = min(jobs, len(videos))
+
     print("MotionTracker Batch Mode")
     print("========================")
-    print(f"Processing {len(videos)} video(s) with {args.tracker} tracker")
+    print(f"Processing {len(videos)} video(s) with {args.tracker} tracker"
+          f" ({jobs} job(s))")
     diff_display = diff_parameters[2] if len(diff_parameters) > 2 else ""
     print(f"Differentiation: {args.diff_algo} {diff_display}")
     print()
 
-    results = []
-    for i, video_path in enumerate(videos, 1):
-        name = os.path.basename(video_path)
-        print(f"[{i}/{len(videos)}] {name} ... ", end="", flush=True)
-        print("tracking ... ", end="", flush=True)
-
-        success, csv_path, error = process_single_video(
-            video_path, args.tracker, args.size_tracking,
-            args.fps, diff_parameters, args.unit,
-        )
-
-        if success:
-            print(f"processing ... OK -> {os.path.basename(csv_path)}")
-        else:
-            print(f"FAILED: {error}")
+    task_args = (args.tracker, args.size_tracking, args.fps,
+                 diff_parameters, args.unit, args.force)
+
+    executor = None
+    if jobs > 1:
+        # Videos are independent, process them in worker processes and
+        # report the results in input order
+        executor = ProcessPoolExecutor(max_workers=jobs,
+                                       initializer=_init_worker)
+        futures = [executor.submit(process_single_video, v, *task_args)
+                   for v in videos]
+    else:
+        # QCoreApplication required for QThread.__init__
+        from PyQt5.QtCore import QCoreApplication
+        app = QCoreApplication(sys.argv)  # noqa: F841
 
-        results.append((video_path, success, csv_path, error))
+    results = []
+    try:
+        for i, video_path in enumerate(videos, 1):
+            name = os.path.basename(video_path)
+            print(f"[{i}/{len(videos)}] {name} ... ", end="", flush=True)
+
+            if executor is not None:
+                success, csv_path, error = futures[i - 1].result()
+            else:
+                success, csv_path, error = process_single_video(
+                    video_path, *task_args
+                )
+
+            if success and error == "cached":
+                print(f"up to date -> {os.path.basename(csv_path)}")
+            elif success:
+                print(f"tracking ... processing ... OK -> "
+                      f"{os.path.basename(csv_path)}")
+            else:
+                print(f"tracking ... FAILED: {error}")
+
+            results.append((video_path, success, csv_path, error))
+    finally:
+        # A failed worker raises from result(): stop the pool rather than
+        # leave it processing videos that will never be reported
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
     ok = sum(1 for _, s, _, _ in results if s)
     fail = len(results) - ok
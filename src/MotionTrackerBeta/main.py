@@ -17,6 +17,7 @@
 import sys
 import os
 import argparse
+import multiprocessing
 
 # Ensure local source code is used instead of installed package
 _src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -24,6 +25,17 @@ if _src_dir not in sys.path:
     sys.path.insert(0, _src_dir)
 
 
+def _positive_int(value):
+    """argparse type for options that need an integer of at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 def MotionTracker():
     from PyQt5.QtWidgets import QApplication, QSplashScreen
     from MotionTrackerBeta.widgets.gui import VideoWidget
@@ -47,6 +59,9 @@ def MotionTracker():
 
 
 def main():
+    # batch workers re-enter here in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
     parser = argparse.ArgumentParser(
         prog="motiontracker",
         description="MotionTracker - Motion tracking and analysis",
@@ -93,6 +108,14 @@ def main():
         "--unit", default="pix", choices=["pix", "mm", "m"],
         help="Output unit (default: pix). mm/m require ruler in settings.",
     )
+    batch_parser.add_argument(
+        "--force", action="store_true",
+        help="Reprocess videos even if their CSV is newer than video and settings",
+    )
+    batch_parser.add_argument(
+        "--jobs", type=_positive_int, default=None,
+        help="Number of videos processed in parallel (default: half the CPU cores)",
+    )
 
     match_parser = subparsers.add_parser(
         "match", help="Match tracking regions from a reference video to others",
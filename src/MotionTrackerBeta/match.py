@@ -11,19 +11,29 @@ import sys
 import cv2
 import numpy as np
 
-from MotionTrackerBeta.batch import VIDEO_EXTENSIONS, find_videos
-from MotionTrackerBeta.video_io import open_video
+from MotionTrackerBeta.batch import (VIDEO_EXTENSIONS, find_videos,
+                                     videos_with_settings)
+from MotionTrackerBeta.video_io import VideoReader
 
+# Shared ORB detector and matcher, reused for every object and target video
+_ORB = cv2.ORB_create(nfeatures=500)
+_MATCHER = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
 
-def read_frame(video_path, frame_num):
-    """Read a specific frame from a video file. Returns BGR image or None."""
-    cap = open_video(video_path)
-    if not cap.isOpened():
-        return None
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-    ret, frame = cap.read()
-    cap.release()
-    return frame if ret else None
+
+def read_frame(video_path, frame_num, gray=False):
+    """Read a specific frame from a video file. Returns BGR image or None.
+
+    With gray=True the frame is returned as a grayscale image.
+    """
+    with VideoReader(video_path) as reader:
+        return reader.frame(frame_num, gray)
+
+
+def to_gray(image):
+    """Convert a BGR image to grayscale, single-channel images are returned as is."""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
 
 def extract_template(frame, rectangle):
@@ -32,45 +42,90 @@ def extract_template(frame, rectangle):
     return frame[y:y+h, x:x+w].copy()
 
 
-def template_match(template, target_frame):
+def _match_full(template, target_frame):
+    result = cv2.matchTemplate(target_frame, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return max_loc[0], max_loc[1], max_val
+
+
+def template_match(template, target_frame, max_levels=2, min_size=16):
     """Find best template match location.
 
+    Searches coarse-to-fine: the match is located on a downsampled image
+    pyramid (up to max_levels, keeping the template at least min_size
+    pixels), then refined in a small full-resolution window.
+
     Returns (x, y, confidence) where (x, y) is the top-left corner.
     """
-    result = cv2.matchTemplate(target_frame, template, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, max_loc = cv2.minMaxLoc(result)
-    return max_loc[0], max_loc[1], max_val
+    th, tw = template.shape[:2]
+    levels = 0
+    while levels < max_levels and min(th, tw) >> (levels + 1) >= min_size:
+        levels += 1
+    if levels == 0:
+        return _match_full(template, target_frame)
+
+    small_template, small_frame = template, target_frame
+    for _ in range(levels):
+        small_template = cv2.pyrDown(small_template)
+        small_frame = cv2.pyrDown(small_frame)
+    cx, cy, _ = _match_full(small_template, small_frame)
+
+    # Refine around the coarse location at full resolution
+    scale = 1 << levels
+    margin = 2 * scale
+    fh, fw = target_frame.shape[:2]
+    x0 = max(0, min(cx * scale - margin, fw - tw))
+    y0 = max(0, min(cy * scale - margin, fh - th))
+    x1 = min(fw, cx * scale + tw + margin)
+    y1 = min(fh, cy * scale + th + margin)
+    x, y, confidence = _match_full(template, target_frame[y0:y1, x0:x1])
+    return x0 + x, y0 + y, confidence
+
+
+def detect_features(frame):
+    """Detect ORB features.
+
+    Returns (points, descriptors) where points is an (N, 2) float32 array of
+    keypoint coordinates.
+    """
+    kp, des = _ORB.detectAndCompute(frame, None)
+    pts = np.array([k.pt for k in kp], dtype=np.float32).reshape(-1, 2)
+    return pts, des
 
 
-def feature_match(ref_patch, target_frame, rectangle):
+def feature_match(ref_patch, pts2, des2, rectangle):
     """ORB feature matching fallback.
 
+    pts2 and des2 are the target frame features from detect_features(), so
+    the full frame only has to be processed once for all objects.
+
     Returns (x, y, confidence) or None if not enough matches.
     """
-    orb = cv2.ORB_create(nfeatures=500)
-
-    kp1, des1 = orb.detectAndCompute(ref_patch, None)
-    kp2, des2 = orb.detectAndCompute(target_frame, None)
+    pts1, des1 = detect_features(ref_patch)
 
-    if des1 is None or des2 is None or len(kp1) < 4 or len(kp2) < 4:
+    if des1 is None or des2 is None or len(pts1) < 4 or len(pts2) < 4:
         return None
 
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-    matches = bf.knnMatch(des1, des2, k=2)
+    matches = _MATCHER.knnMatch(des1, des2, k=2)
 
-    # Lowe's ratio test
-    good = []
-    for m_n in matches:
-        if len(m_n) == 2:
-            m, n = m_n
-            if m.distance < 0.75 * n.distance:
-                good.append(m)
+    # Lowe's ratio test, queries without two neighbours never pass
+    dists = np.array(
+        [(m_n[0].distance, m_n[1].distance) if len(m_n) == 2 else (np.inf, np.inf)
+         for m_n in matches],
+        dtype=np.float32,
+    ).reshape(-1, 2)
+    good = [matches[i][0]
+            for i in np.flatnonzero(dists[:, 0] < 0.75 * dists[:, 1])]
 
     if len(good) < 4:
         return None
 
-    src_pts = np.float32([kp1[m.queryIdx].pt for m in good]).reshape(-1, 1, 2)
-    dst_pts = np.float32([kp2[m.trainIdx].pt for m in good]).reshape(-1, 1, 2)
+    query_idx = np.fromiter((m.queryIdx for m in good), dtype=np.intp,
+                            count=len(good))
+    train_idx = np.fromiter((m.trainIdx for m in good), dtype=np.intp,
+                            count=len(good))
+    src_pts = pts1[query_idx].reshape(-1, 1, 2)
+    dst_pts = pts2[train_idx].reshape(-1, 1, 2)
 
     H, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
     if H is None:
@@ -89,21 +144,42 @@ def feature_match(ref_patch, target_frame, rectangle):
     return new_x, new_y, confidence
 
 
-def match_object(ref_frame, target_frame, obj_dict, method="auto", threshold=0.7):
-    """Match a single object from reference to target frame.
+def extract_templates(ref_frame, objects):
+    """Extract the grayscale reference template of every object once.
+
+    Returns list of (obj_dict, template) where template is None for objects
+    without a usable rectangle.
+    """
+    templates = []
+    for obj in objects:
+        rect = obj.get("rectangle")
+        template = extract_template(ref_frame, rect) if rect else None
+        if template is not None and template.size == 0:
+            template = None
+        if template is not None:
+            template = to_gray(template)
+        templates.append((obj, template))
+    return templates
+
+
+def match_object(template, target_frame, obj_dict, method="auto", threshold=0.7,
+                 target_features=None):
+    """Match a single object's reference template in the target frame.
+
+    template is the patch extracted from the reference frame at the
+    object's rectangle, see extract_templates(). target_features is an
+    optional callable returning the cached (points, descriptors) of
+    target_frame for feature matching.
 
     Returns (updated_obj_dict, confidence, method_used) or (None, 0, None) on failure.
     """
     rect = obj_dict.get("rectangle")
-    if not rect:
-        return None, 0.0, None
-
-    template = extract_template(ref_frame, rect)
-    if template.size == 0:
+    if not rect or template is None:
         return None, 0.0, None
 
     x, y, w, h = [int(v) for v in rect]
     best_x, best_y, confidence, used_method = None, None, 0.0, None
+    tconf = None
 
     if method in ("template", "auto"):
         tx, ty, tconf = template_match(template, target_frame)
@@ -111,7 +187,11 @@ def match_object(ref_frame, target_frame, obj_dict, method="auto", threshold=0.7
             best_x, best_y, confidence, used_method = tx, ty, tconf, "template"
 
     if used_method is None and method in ("feature", "auto"):
-        result = feature_match(template, target_frame, rect)
+        if target_features is None:
+            pts2, des2 = detect_features(target_frame)
+        else:
+            pts2, des2 = target_features()
+        result = feature_match(template, pts2, des2, rect)
         if result is not None:
             fx, fy, fconf = result
             if fconf >= threshold:
@@ -119,8 +199,7 @@ def match_object(ref_frame, target_frame, obj_dict, method="auto", threshold=0.7
 
     if used_method is None:
         # Return the best template score even if below threshold for reporting
-        if method != "feature":
-            tx, ty, tconf = template_match(template, target_frame)
+        if tconf is not None:
             return None, tconf, "template (below threshold)"
         return None, 0.0, None
 
@@ -137,20 +216,32 @@ def match_object(ref_frame, target_frame, obj_dict, method="auto", threshold=0.7
     return new_obj, confidence, used_method
 
 
-def match_video(ref_frame, target_video_path, objects, method, threshold,
-                target_frame_num):
+def match_video(templates, reader, method, threshold, target_frame_num):
     """Match all objects from reference into a target video.
 
+    templates is the list of (obj_dict, template) from extract_templates(),
+    reader is an open VideoReader of the target video.
+
     Returns list of (obj_name, matched_obj_dict_or_None, confidence, method_used).
     """
-    target_frame = read_frame(target_video_path, target_frame_num)
+    # Templates are grayscale, match on the luma of the target as well
+    target_frame = reader.frame(target_frame_num, gray=True)
     if target_frame is None:
-        return [(o["name"], None, 0.0, "cannot read video") for o in objects]
+        return [(o["name"], None, 0.0, "cannot read video") for o, _ in templates]
+
+    # Target frame features are computed on first use and shared by all objects
+    features = None
+
+    def target_features():
+        nonlocal features
+        if features is None:
+            features = detect_features(target_frame)
+        return features
 
     results = []
-    for obj in objects:
+    for obj, template in templates:
         matched, conf, method_used = match_object(
-            ref_frame, target_frame, obj, method, threshold
+            template, target_frame, obj, method, threshold, target_features
         )
         results.append((obj["name"], matched, conf, method_used))
     return results
@@ -193,11 +284,16 @@ def run_match(args):
         sys.exit(1)
 
     # Read reference frame
-    ref_frame = read_frame(ref_path, args.frame)
+    ref_frame = read_frame(ref_path, args.frame, gray=True)
     if ref_frame is None:
         print(f"Cannot read frame {args.frame} from {ref_path}", file=sys.stderr)
         sys.exit(1)
 
+    # Templates only depend on the reference, extract them once and drop
+    # the full reference frame
+    templates = extract_templates(ref_frame, objects)
+    del ref_frame
+
     # Resolve target videos
     if args.targets:
         targets = find_videos(args.targets)
@@ -214,8 +310,8 @@ def run_match(args):
     # Skip videos that already have settings (unless --overwrite)
     if not args.overwrite:
         before = len(targets)
-        targets = [t for t in targets
-                   if not os.path.isfile(t + ".motiontracker.json")]
+        existing = videos_with_settings(targets)
+        targets = [t for t in targets if t not in existing]
         skipped = before - len(targets)
         if skipped:
             print(f"Skipping {skipped} video(s) with existing settings "
@@ -239,10 +335,11 @@ def run_match(args):
         name = os.path.basename(target)
         print(f"[{i}/{len(targets)}] {name}")
 
-        results = match_video(
-            ref_frame, target, objects, args.method, args.threshold,
-            args.target_frame,
-        )
+        with VideoReader(target) as reader:
+            results = match_video(
+                templates, reader, args.method, args.threshold,
+                args.target_frame,
+            )
 
         matched_objects = []
         all_ok = True
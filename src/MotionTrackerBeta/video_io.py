@@ -1,15 +1,18 @@
 """Video I/O abstraction for MotionTracker.
 
 Provides a factory function that returns cv2.VideoCapture for standard
-video files and DicomCapture for DICOM files (.dcm, .dicom).
+video files and DicomCapture for DICOM files (.dcm, .dicom), and
+VideoReader for random access to single frames.
 """
 
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 import numpy as np
 
-DICOM_EXTENSIONS = {".dcm", ".dicom"}
+DICOM_EXTENSIONS = (".dcm", ".dicom")
 
 
 def open_video(path):
@@ -17,26 +20,192 @@ def open_video(path):
 
     Returns DicomCapture for DICOM files, cv2.VideoCapture otherwise.
     """
-    _, ext = os.path.splitext(path)
-    if ext.lower() in DICOM_EXTENSIONS:
+    if path.lower().endswith(DICOM_EXTENSIONS):
         return DicomCapture(path)
     return cv2.VideoCapture(path)
 
 
+def _uint8_converter(dtype, mn, mx):
+    """Return a function min-max rescaling arrays of dtype from [mn, mx] to uint8.
+
+    Values outside [mn, mx] are clipped to 0 and 255.
+    """
+    if dtype == np.uint8:
+        return lambda arr: arr
+    # Values that already fit in uint8 are kept rather than stretched
+    stretch = not (mx <= mn or (dtype.kind in "ui" and 0 <= mn and mx <= 255))
+
+    def rescale(values):
+        # values is a float array of our own, rescale it in place
+        if stretch:
+            np.subtract(values, mn, out=values)
+            np.divide(values, mx - mn, out=values)
+            np.multiply(values, 255.0, out=values)
+        np.clip(values, 0, 255, out=values)
+        return values.astype(np.uint8)
+
+    if dtype.kind in "ui" and dtype.itemsize <= 2:
+        # 8/16-bit integer data has at most 65536 distinct values: rescale
+        # each of them once in a lookup table indexed by the raw bit
+        # pattern, then gather every pixel through it
+        unsigned = np.dtype(f"u{dtype.itemsize}")
+        values = np.arange(1 << (8 * unsigned.itemsize)).astype(unsigned)
+        lut = rescale(values.view(dtype).astype(np.float64))
+        return lambda arr: lut[arr.view(unsigned)]
+
+    # float32 is ample precision for a uint8 result, at half the memory
+    return lambda arr: rescale(arr.astype(np.float32))
+
+
+def _color_samples(frame):
+    """Return the grayscale [H, W] or RGB [H, W, 3] samples of a decoded frame.
+
+    RGBA frames lose their alpha channel. Conversion to BGR is left to
+    the copy out to the caller.
+    """
+    if frame.ndim == 3 and frame.shape[-1] == 4:
+        return frame[..., :3]
+    return frame
+
+
+def _map_native_frames(path, ds, n_frames):
+    """Memory-map uncompressed pixel data as [N, H, W(, samples)], or None.
+
+    Frames are then read straight from the page cache instead of being
+    decoded by pydicom. Only layouts whose raw bytes are the final pixel
+    values are mapped, anything else is left to pydicom. That excludes
+    BitsStored < BitsAllocated, where pydicom masks or sign-extends the
+    unused high bits.
+    """
+    from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+    try:
+        tsyntax = ds.file_meta.TransferSyntaxUID
+        bits = int(ds.BitsAllocated)
+        signed = int(ds.PixelRepresentation) == 1
+        spp = int(getattr(ds, "SamplesPerPixel", 1))
+        if (tsyntax not in (ExplicitVRLittleEndian, ImplicitVRLittleEndian)
+                or bits not in (8, 16, 32)
+                or int(ds.BitsStored) != bits
+                or spp > 1 and int(getattr(ds, "PlanarConfiguration", 0)) != 0
+                or ds.PhotometricInterpretation not in
+                ("MONOCHROME1", "MONOCHROME2", "RGB")):
+            return None
+
+        dtype = np.dtype(f"<{'i' if signed else 'u'}{bits // 8}")
+        shape = (n_frames, int(ds.Rows), int(ds.Columns))
+        if spp > 1:
+            shape += (spp,)
+        # Locate the value without loading it, it is deferred on read
+        elem = ds.get_item(0x7FE00010, keep_deferred=True)
+        if elem is None or elem.length < dtype.itemsize * np.prod(shape):
+            return None
+        return np.memmap(path, dtype=dtype, mode="r",
+                         offset=elem.value_tell, shape=shape)
+    except Exception:
+        return None
+
+
+class VideoReader:
+    """Random access to single frames, keeping the video open between reads.
+
+    Opening a capture initialises the demuxer and decoder, so callers
+    that need several frames of the same video should reuse one reader:
+
+        with VideoReader(path) as reader:
+            frame = reader.frame(10)
+    """
+
+    def __init__(self, path):
+        self._cap = open_video(path)
+        self._next = 0  # index of the frame the next grab() returns
+
+        # Frames are fetched one at a time, avoid backend read-ahead buffering
+        try:
+            self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except cv2.error:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def isOpened(self):
+        return self._cap.isOpened()
+
+    def frame(self, frame_num, gray=False):
+        """Return frame frame_num as a BGR image, or None if it cannot be read.
+
+        With gray=True the frame is returned as a single-channel image.
+        """
+        if not self._cap.isOpened():
+            return None
+
+        if frame_num != self._next:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+            self._next = int(self._cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+        # Inter-coded streams may land on the preceding keyframe; skip the
+        # remaining frames with grab() so they are never fully decoded.
+        while self._next < frame_num:
+            if not self._cap.grab():
+                return None
+            self._next += 1
+
+        if not self._cap.grab():
+            return None
+        self._next += 1
+        if gray and hasattr(self._cap, "retrieve_gray"):
+            ret, frame = self._cap.retrieve_gray()
+        else:
+            ret, frame = self._cap.retrieve()
+            if ret and gray:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame if ret else None
+
+    def release(self):
+        self._cap.release()
+
+
 class DicomCapture:
     """cv2.VideoCapture-compatible wrapper for DICOM multi-frame files.
 
-    Reads all frames into memory on open. Supports the subset of the
+    Uncompressed pixel data is memory-mapped from the file, other
+    transfer syntaxes are decoded frame by frame on demand. The most
+    recent frames are kept in a small cache. Supports the subset of the
     VideoCapture API used by MotionTracker: isOpened, get, set, read,
-    retrieve, release.
+    grab, retrieve, release.
+
+    read() and retrieve() return the same buffer on every call (or the
+    image passed in), so a frame is only valid until the next read.
+    read_gray() and retrieve_gray() do the same with a grayscale [H, W]
+    frame, without expanding single-channel cines to BGR.
+
+    window_center and window_width hold the display window from the
+    WindowCenter/WindowWidth tags, or None when the file has none.
     """
 
+    CACHE_SIZE = 8  # decoded frames kept for scrubbing back and forth
+    RANGE_SAMPLES = 8  # frames sampled for the normalisation range
+
     def __init__(self, path):
-        self._frames = None  # numpy array [N, H, W, 3] BGR uint8
+        self._file = None  # open DICOM file frames are decoded from
+        self._decode = None  # frame index -> decoded pixel data
+        self._frame = None  # frame index -> cached [H, W] or [H, W, 3] RGB uint8
+        self._n_frames = 0
+        self._width = 0
+        self._height = 0
         self._fps = 30.0
+        self._props = {}  # constant get() values, filled once opened
         self._pos = 0  # next frame to read
-        self._last_frame = None  # last frame returned by read()
+        self._last_index = None  # index of the last grabbed frame
+        self._scratch = None  # buffer returned by read() and retrieve()
+        self._gray_scratch = None  # buffer returned by read_gray() and retrieve_gray()
         self._opened = False
+        self.window_center = None
+        self.window_width = None
 
         try:
             import pydicom
@@ -44,41 +213,104 @@ class DicomCapture:
             return
 
         try:
-            ds = pydicom.dcmread(path)
+            # Large elements (the pixel data) are only read when accessed
+            ds = pydicom.dcmread(path, defer_size="100 KB")
+            # The frame layout comes from the tags, never from guessing
+            # at the shape of the pixel data
+            self._n_frames = int(getattr(ds, "NumberOfFrames", 1) or 1)
+            self._height = int(ds.Rows)
+            self._width = int(ds.Columns)
+            samples_per_pixel = int(getattr(ds, "SamplesPerPixel", 1))
         except Exception:
             return
+        if samples_per_pixel not in (1, 3, 4):
+            # Only grayscale, RGB and RGBA can be shown as BGR
+            return
+        frame_shape = (self._height, self._width)
+        if samples_per_pixel > 1:
+            frame_shape += (samples_per_pixel,)
+
+        frames = _map_native_frames(path, ds, self._n_frames)
+        if frames is None:
+            try:
+                from pydicom.pixels import pixel_array
+            except ImportError:
+                # pydicom < 3 can only decode all frames at once
+                try:
+                    frames = ds.pixel_array
+                except Exception:
+                    return
+                if self._n_frames == 1:
+                    frames = frames[np.newaxis, ...]
+            else:
+                # Only the header and the requested frame are read
+                self._file = open(path, "rb")
+                self._decode = lambda index: pixel_array(self._file, index=index)
+        if self._decode is None:
+            self._decode = frames.__getitem__
 
         try:
-            pixel_array = ds.pixel_array
+            first = self._decode(0)
         except Exception:
+            self.release()
+            return
+        if first.shape != frame_shape:
+            self.release()
             return
 
-        # Normalise shape to [N, H, W, channels]
-        if pixel_array.ndim == 2:
-            # Single frame grayscale [H, W] -> [1, H, W]
-            pixel_array = pixel_array[np.newaxis, ...]
-
-        if pixel_array.ndim == 3 and pixel_array.shape[-1] not in (3, 4):
-            # [N, H, W] grayscale -> [N, H, W, 3] BGR
-            pixel_array = np.stack(
-                [pixel_array, pixel_array, pixel_array], axis=-1
-            )
-        elif pixel_array.ndim == 4 and pixel_array.shape[-1] == 3:
-            # [N, H, W, 3] RGB -> BGR
-            pixel_array = pixel_array[..., ::-1].copy()
-        elif pixel_array.ndim == 4 and pixel_array.shape[-1] == 4:
-            # [N, H, W, 4] RGBA -> BGR (drop alpha)
-            pixel_array = pixel_array[..., 2::-1].copy()
-
-        # Normalise to uint8
-        if pixel_array.dtype != np.uint8:
-            arr = pixel_array.astype(np.float64)
-            mn, mx = arr.min(), arr.max()
-            if mx > mn:
-                arr = (arr - mn) / (mx - mn) * 255.0
-            pixel_array = arr.astype(np.uint8)
-
-        self._frames = pixel_array
+        # Rescale with one range for the whole cine so brightness is
+        # consistent between frames. Take it from the 1st/99th percentile
+        # of a few frames spread over the cine: scanning every frame is
+        # costly, and the extremes are often single hot or dead pixels.
+        mn = mx = 0
+        if first.dtype != np.uint8:
+            # Frame 0 is always sampled and has been decoded already
+            indices = np.linspace(
+                0, self._n_frames - 1, min(self._n_frames, self.RANGE_SAMPLES)
+            ).astype(int).tolist()[1:]
+            samples = [_color_samples(first)]
+            try:
+                if (self._file is not None and indices
+                        and ds.file_meta.TransferSyntaxUID.is_encapsulated):
+                    # Compressed frames: the decoders release the GIL, so
+                    # decode in parallel, each worker opening the file itself
+                    workers = min(len(indices), os.cpu_count() or 1)
+                    with ThreadPoolExecutor(max_workers=workers) as pool:
+                        samples += pool.map(
+                            lambda index: _color_samples(
+                                pixel_array(path, index=index)),
+                            indices,
+                        )
+                else:
+                    samples += [_color_samples(self._decode(index))
+                                for index in indices]
+            except Exception:
+                self.release()
+                return
+            samples = np.stack(samples)
+            mn, mx = np.percentile(samples, [1, 99]).tolist()
+            fits_uint8 = first.dtype.kind in "ui" and 0 <= mn and mx <= 255
+            if mx <= mn or fits_uint8:
+                # The percentiles collapse when one value covers most of
+                # the image (a small marker on a uniform background), and
+                # integer data can fit uint8 while brighter pixels do not:
+                # fall back to the true extremes, keeping integer values
+                # unstretched only when those fit. Float data is always
+                # stretched, so it keeps the percentile window otherwise.
+                mn, mx = samples.min().item(), samples.max().item()
+        to_uint8 = _uint8_converter(first.dtype, mn, mx)
+
+        # Hand the decoded frame 0 over to its first read
+        pending = {0: first}
+
+        def load(index):
+            frame = pending.pop(index, None)
+            if frame is None:
+                frame = self._decode(index)
+            return to_uint8(_color_samples(frame))
+
+        self._frame = functools.lru_cache(maxsize=self.CACHE_SIZE)(load)
+        self._scratch = np.empty((self._height, self._width, 3), np.uint8)
         self._opened = True
 
         # Extract FPS from DICOM tags
@@ -100,23 +332,32 @@ class DicomCapture:
             except (TypeError, ValueError):
                 pass
 
+        # WindowCenter (0028,1050) and WindowWidth (0028,1051) may list
+        # several windows, the first one is the default
+        for attr, keyword in (("window_center", "WindowCenter"),
+                              ("window_width", "WindowWidth")):
+            value = getattr(ds, keyword, None)
+            if isinstance(value, pydicom.multival.MultiValue):
+                value = value[0] if value else None
+            try:
+                setattr(self, attr, float(value))
+            except (TypeError, ValueError):
+                pass
+
+        self._props = {
+            cv2.CAP_PROP_FPS: self._fps,
+            cv2.CAP_PROP_FRAME_COUNT: float(self._n_frames),
+            cv2.CAP_PROP_FRAME_WIDTH: float(self._width),
+            cv2.CAP_PROP_FRAME_HEIGHT: float(self._height),
+        }
+
     def isOpened(self):
         return self._opened
 
     def get(self, prop_id):
-        if not self._opened:
-            return 0.0
-        if prop_id == cv2.CAP_PROP_FPS:
-            return self._fps
-        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
-            return float(len(self._frames))
-        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
-            return float(self._frames.shape[2])
-        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
-            return float(self._frames.shape[1])
-        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES and self._opened:
             return float(self._pos)
-        return 0.0
+        return self._props.get(prop_id, 0.0)
 
     def set(self, prop_id, value):
         if prop_id == cv2.CAP_PROP_POS_FRAMES:
@@ -124,21 +365,73 @@ class DicomCapture:
             return True
         return False
 
-    def read(self):
-        if not self._opened or self._pos < 0 or self._pos >= len(self._frames):
-            self._last_frame = None
+    def read(self, image=None):
+        if not self.grab():
             return False, None
-        frame = self._frames[self._pos].copy()
-        self._last_frame = frame
+        return self.retrieve(image)
+
+    def grab(self):
+        if not self._opened or self._pos < 0 or self._pos >= self._n_frames:
+            self._last_index = None
+            return False
+        self._last_index = self._pos
         self._pos += 1
-        return True, frame
+        return True
 
-    def retrieve(self):
-        if self._last_frame is not None:
-            return True, self._last_frame.copy()
-        return False, None
+    def retrieve(self, image=None):
+        frame = self._last_frame()
+        if frame is None:
+            return False, None
+        shape = (self._height, self._width, 3)
+        if (image is None or image.shape != shape
+                or image.dtype != np.uint8):
+            image = self._scratch
+        # Copy into a reused buffer: callers draw on the returned frame,
+        # which must not alter the cached one
+        code = cv2.COLOR_GRAY2BGR if frame.ndim == 2 else cv2.COLOR_RGB2BGR
+        cv2.cvtColor(frame, code, dst=image)
+        return True, image
+
+    def read_gray(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve_gray(image)
+
+    def retrieve_gray(self, image=None):
+        frame = self._last_frame()
+        if frame is None:
+            return False, None
+        shape = (self._height, self._width)
+        if (image is None or image.shape != shape
+                or image.dtype != np.uint8):
+            if self._gray_scratch is None:
+                self._gray_scratch = np.empty(shape, np.uint8)
+            image = self._gray_scratch
+        if frame.ndim == 2:
+            np.copyto(image, frame)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=image)
+        return True, image
+
+    def _last_frame(self):
+        """Return the cached pixels of the last grabbed frame, or None."""
+        if self._last_index is None:
+            return None
+        try:
+            return self._frame(self._last_index)
+        except Exception:
+            return None
 
     def release(self):
-        self._frames = None
-        self._last_frame = None
+        if self._frame is not None:
+            self._frame.cache_clear()
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._decode = None
+        self._frame = None
+        self._last_index = None
+        self._scratch = None
+        self._gray_scratch = None
+        self._props = {}
         self._opened = False
@@ -140,9 +140,11 @@ class TrackingThread(QThread):
             h0 = M.rectangle[3]
 
             # tracking
+            buffer = None
             for i in range(int(self.section_stop - self.section_start)):
-                # read the next frame
-                ret, frame = self.camera.read()
+                # read the next frame, decoding into the previous frame's buffer
+                ret, buffer = self.camera.read(buffer)
+                frame = buffer
 
                 # handle errors
                 if not ret:
@@ -334,9 +336,11 @@ class TrackingThreadV2(QThread):
         self.timestamp.append(0)
 
         # tracking loop
+        buffer = None
         for j in range(int(self.section_stop - self.section_start)):
-            # read frame
-            ret, frame = self.camera.read()
+            # read frame, decoding into the previous frame's buffer
+            ret, buffer = self.camera.read(buffer)
+            frame = buffer
 
             # check for errors
             if not ret: